@@ -1,228 +1,180 @@
 import streamlit as st
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import asyncio
 import plotly.express as px
+from pandas.tseries.offsets import MonthBegin
 from datetime import datetime
 import os
 import time
-import re
+import threading
 
-# --- CONSTANTS & CONFIG ---
-DATA_FILE = 'eb2_india_data.csv'
+from tracker_core import CACHE_FILE, DATA_FILE, DB_COLUMNS, DB_DTYPES, MONTHS_DICT, SEED_FILE, UNRELEASED_TTL, clear_parsed_cells, fetch_missing_bulletins, is_unreleased_month
 
-MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december")
-MONTHS_DICT = {
-    1: "january", 2: "february", 3: "march", 4: "april",
-    5: "may", 6: "june", 7: "july", 8: "august",
-    9: "september", 10: "october", 11: "november", 12: "december"
-}
+# --- CONSTANTS & CONFIG ---
+_HIDE_ST_STYLE = """<style>
+#MainMenu {visibility: hidden;}
+.stDeployButton {display: none;}
+footer {visibility: hidden;}
+</style>"""
 
 st.set_page_config(page_title="EB-2 & EB-3 India Visa Tracker", layout="wide")
 
 # --- HIDE STREAMLIT BRANDING & MENUS ---
-hide_st_style = "<style>\n"
-hide_st_style += "#MainMenu " + chr(123) + "visibility: hidden;" + chr(125) + "\n"
-hide_st_style += ".stDeployButton " + chr(123) + "display: none;" + chr(125) + "\n"
-hide_st_style += "footer " + chr(123) + "visibility: hidden;" + chr(125) + "\n"
-hide_st_style += "</style>"
-st.markdown(hide_st_style, unsafe_allow_html=True)
+st.markdown(_HIDE_ST_STYLE, unsafe_allow_html=True)
 
-# --- UTILITY FUNCTIONS ---
-def parse_priority_date(date_str, bulletin_date):
-    if not date_str or pd.isna(date_str): 
-        return pd.NaT
-    date_str = str(date_str).strip().upper()
-    
-    if date_str in ("C", "CURRENT"):
-        return bulletin_date
-    if date_str in ("U", "UNAUTHORIZED", "UNAVAILABLE"):
-        return pd.NaT
+# --- DATABASE ---
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_db():
+    if os.path.exists(DATA_FILE):
+        df = pd.read_parquet(DATA_FILE)
+    elif os.path.exists(SEED_FILE):
+        # First run: start from the history exported by scraper.py
+        df = pd.read_csv(SEED_FILE, parse_dates=list(DB_COLUMNS))
+    else:
+        df = pd.DataFrame(columns=DB_COLUMNS)
         
-    try:
-        return pd.to_datetime(date_str, format='%d%b%y')
-    except:
-        try:
-            return pd.to_datetime(date_str)
-        except:
-            return pd.NaT
-
-def get_bulletin_url(month_name, year):
-    month_idx = MONTHS.index(month_name.lower()) + 1
-    fiscal_year = year + 1 if month_idx >= 10 else year
-    return f"https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/{fiscal_year}/visa-bulletin-for-{month_name.lower()}-{year}.html"
-
-# --- SCRAPING LOGIC ---
-def extract_india_dates(df_table):
-    cols_as_list = df_table.columns.values.tolist()
-    raw_data = list((cols_as_list,))
-    raw_data.extend(df_table.values.tolist())
+    return df.astype(DB_DTYPES).sort_values(by='Bulletin_Date').reset_index(drop=True)
+
+@st.cache_resource(show_spinner=False)
+def _fetched_bulletins():
+    # Tuple of missing months -> (fetched_at, results), shared by every rerun and session.
+    # Not st.cache_data: a cached call replays its elements, so it could not drive the progress bar below.
+    # The lock lives here too: this script's own globals are rebuilt on every rerun, so only a cached one is shared.
+    return dict(), threading.Lock()
+
+def _fetch_bulletins(missing_dates, status_text):
+    # Keyed on the months still missing, so reruns while next month is unreleased skip the network entirely
+    store, store_lock = _fetched_bulletins()
+    with store_lock:
+        fetched_at, results = store.get(missing_dates, (None, None))
+    if results is not None and datetime.now() - fetched_at < UNRELEASED_TTL:
+        return results
     
-    india_col_idx = None
-    for row in raw_data:
-        for j, cell in enumerate(row):
-            if 'INDIA' in str(cell).upper():
-                india_col_idx = j
-                break
-        if india_col_idx is not None: 
-            break
-            
-    second_row_idx = None
-    third_row_idx = None
+    progress_bar = st.progress(0)
+    status_text.text(f"Scraping {len(missing_dates)} missing bulletin(s)...")
     
-    for i, row in enumerate(raw_data):
-        for cell in row:
-            cell_str = str(cell).upper()
-            if second_row_idx is None and re.search(r'\b2ND\b', cell_str):
-                second_row_idx = i
-            if third_row_idx is None and re.search(r'\b3RD\b', cell_str):
-                third_row_idx = i
-        if second_row_idx is not None and third_row_idx is not None:
-            break
-            
-    eb2_date, eb3_date = None, None
-    if india_col_idx is not None:
-        for i, row in enumerate(raw_data):
-            if i == second_row_idx:
-                for j, cell in enumerate(row):
-                    if j == india_col_idx: eb2_date = cell
-            if i == third_row_idx:
-                for j, cell in enumerate(row):
-                    if j == india_col_idx: eb3_date = cell
-                        
-    return eb2_date, eb3_date
-
-def fetch_bulletin_dates(month_name, year):
-    url = get_bulletin_url(month_name, year)
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+    def on_progress(done, d):
+        # Every update is a round-trip to the browser, so only redraw every few bulletins
+        if done % 5 == 0 or done == len(missing_dates):
+            status_text.text(f"Scraped {MONTHS_DICT.get(d.month).capitalize()} {d.year} bulletin ({done}/{len(missing_dates)})...")
+            progress_bar.progress(done / len(missing_dates))
     
-    # REPAIRED: Added back the proxy fallback to bypass the Akamai Firewall
-    urls_to_try = (
-        url,
-        "https://api.allorigins.win/raw?url=" + url
-    )
+    results = asyncio.run(fetch_missing_bulletins(missing_dates, on_progress))
+    progress_bar.empty()
     
-    html_content = None
-    for target_url in urls_to_try:
-        try:
-            response = requests.get(target_url, headers=headers, timeout=15)
-            if response.status_code == 200 and "Access Denied" not in response.text: 
-                html_content = response.content
-                break
-        except Exception:
-            pass
-            
-    if not html_content:
-        return pd.NaT, pd.NaT, pd.NaT, pd.NaT
+    # Only cache after a real fetch; drop stale entries for month sets that are no longer missing
+    now = datetime.now()
+    with store_lock:
+        for key in list(key for key, (saved_at, _) in store.items() if now - saved_at >= UNRELEASED_TTL):
+            del store[key]
+        store[missing_dates] = (now, results)
+    return results
+
+def _scrape_missing(missing_dates):
+    status_text = st.empty()
+    results = _fetch_bulletins(tuple(missing_dates), status_text)
     
-    try:
-        soup = BeautifulSoup(html_content, 'lxml')
-        tables = pd.read_html(str(soup))
+    unreleased_note = None
+    new_rows = list()
+    for d in missing_dates:
+        month_name = MONTHS_DICT.get(d.month)
+        eb2_fad, eb2_dof = results[d]['2ND']
+        eb3_fad, eb3_dof = results[d]['3RD']
         
-        dates_found_eb2 = list()
-        dates_found_eb3 = list()
+        # Keep partial bulletins (e.g. Final Action "U" but Filing dates published); skip only if nothing was found
+        if pd.isna(list((eb2_fad, eb2_dof, eb3_fad, eb3_dof))).all():
+            if is_unreleased_month(month_name, d.year):
+                # Added visual debug so it won't fail silently anymore!
+                unreleased_note = f"The {month_name.capitalize()} {d.year} bulletin is either unreleased or temporarily blocked by a firewall."
+                break 
+            else:
+                continue
         
-        for df_table in tables:
-            eb2_d, eb3_d = extract_india_dates(df_table)
-            # Extra guard to prevent empty 'NaN' tables from breaking the logic
-            if eb2_d is not None and str(eb2_d).strip().lower() not in ("", "nan"): 
-                dates_found_eb2.append(eb2_d)
-            if eb3_d is not None and str(eb3_d).strip().lower() not in ("", "nan"): 
-                dates_found_eb3.append(eb3_d)
-                
-        bulletin_date = pd.to_datetime(f"01 {month_name} {year}")
-        eb2_fad, eb2_dof, eb3_fad, eb3_dof = pd.NaT, pd.NaT, pd.NaT, pd.NaT
+        new_rows.append(dict(
+            Bulletin_Date=d,
+            EB2_Filing=eb2_dof,
+            EB2_FAD=eb2_fad,
+            EB3_Filing=eb3_dof,
+            EB3_FAD=eb3_fad
+        ))
         
-        for idx, date_val in enumerate(dates_found_eb2):
-            if idx == 0: eb2_fad = parse_priority_date(date_val, bulletin_date)
-            elif idx == 1: eb2_dof = parse_priority_date(date_val, bulletin_date)
-            
-        for idx, date_val in enumerate(dates_found_eb3):
-            if idx == 0: eb3_fad = parse_priority_date(date_val, bulletin_date)
-            elif idx == 1: eb3_dof = parse_priority_date(date_val, bulletin_date)
-            
-        return eb2_fad, eb2_dof, eb3_fad, eb3_dof
-    except Exception:
-        return pd.NaT, pd.NaT, pd.NaT, pd.NaT
+    if new_rows:
+        status_text.success(f"Successfully appended {len(new_rows)} new month(s) of data to the charts!")
+        time.sleep(2)
+    # Leave the note up instead of sleeping on it: this branch runs on every rerun until the bulletin is out
+    if unreleased_note:
+        status_text.info(unreleased_note)
+    else:
+        status_text.empty()
+    
+    return pd.DataFrame(new_rows, columns=DB_COLUMNS).astype(DB_DTYPES)
 
 def init_or_update_db():
-    if os.path.exists(DATA_FILE):
-        df = pd.read_csv(DATA_FILE)
-        df = df.assign(Bulletin_Date=pd.to_datetime(df.Bulletin_Date))
-        df = df.assign(EB2_Filing=pd.to_datetime(df.EB2_Filing))
-        df = df.assign(EB2_FAD=pd.to_datetime(df.EB2_FAD))
-        df = df.assign(EB3_Filing=pd.to_datetime(df.EB3_Filing))
-        df = df.assign(EB3_FAD=pd.to_datetime(df.EB3_FAD))
-    else:
-        df = pd.DataFrame(columns=('Bulletin_Date', 'EB2_Filing', 'EB2_FAD', 'EB3_Filing', 'EB3_FAD'))
+    df = load_db()
         
-    today = datetime.today()
     start_date = datetime(2017, 1, 1)
     
-    next_month = today + pd.DateOffset(months=1)
-    target_date = datetime(next_month.year, next_month.month, 1)
-    current_month_start = datetime(today.year, today.month, 1)
+    # First day of next month, straight from a pandas month offset
+    target_date = pd.Timestamp.today().normalize().replace(day=1) + MonthBegin(1)
     
     dates_to_check = pd.date_range(start=start_date, end=target_date, freq='MS')
     
-    missing_dates = list()
-    for d in dates_to_check:
-        if df.empty or d not in df.Bulletin_Date.values:
-            missing_dates.append(d)
+    missing_dates = list(dates_to_check.difference(pd.DatetimeIndex(df.Bulletin_Date)))
+    
+    # Still running off the CSV seed: convert it once so later cold starts read Parquet directly
+    needs_save = not df.empty and not os.path.exists(DATA_FILE)
             
     if missing_dates:
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        df_new = _scrape_missing(missing_dates)
         
-        new_rows = list()
-        for i, d in enumerate(missing_dates):
-            month_name = MONTHS_DICT.get(d.month)
-            status_text.text(f"Scraping missing {month_name.capitalize()} {d.year} data...")
-            
-            eb2_fad, eb2_dof, eb3_fad, eb3_dof = fetch_bulletin_dates(month_name, d.year)
-            
-            if pd.isna(eb2_fad) and pd.isna(eb3_fad):
-                if d >= current_month_start:
-                    # Added visual debug so it won't fail silently anymore!
-                    status_text.info(f"The {month_name.capitalize()} {d.year} bulletin is either unreleased or temporarily blocked by a firewall.")
-                    time.sleep(2)
-                    break 
-                else:
-                    continue
-            
-            new_rows.append(dict(
-                Bulletin_Date=d,
-                EB2_Filing=eb2_dof,
-                EB2_FAD=eb2_fad,
-                EB3_Filing=eb3_dof,
-                EB3_FAD=eb3_fad
-            ))
-            
-            progress_bar.progress((i + 1) / len(missing_dates))
-            time.sleep(0.3) 
-            
-        if new_rows:
-            df_new = pd.DataFrame(new_rows)
+        if not df_new.empty:
             df = pd.concat((df, df_new), ignore_index=True)
             df = df.sort_values(by='Bulletin_Date').reset_index(drop=True)
+            needs_save = True
             
-            try:
-                df.to_csv(DATA_FILE, index=False)
-            except Exception:
-                pass
-                
-            status_text.success(f"Successfully appended {len(new_rows)} new month(s) of data to the charts!")
-            time.sleep(2)
-            status_text.empty()
-            progress_bar.empty()
-            
-        else:
-            time.sleep(1)
-            status_text.empty()
-            progress_bar.empty()
+    # Skip the write (and its retry on every rerun) when the app directory is read-only
+    if needs_save and os.access(os.path.dirname(os.path.abspath(DATA_FILE)), os.W_OK):
+        try:
+            df.to_parquet(DATA_FILE, index=False, compression='zstd')
+            # Only drop the cached frame once the file really changed (e.g. not on a read-only filesystem)
+            load_db.clear()
+        except Exception:
+            pass
         
     return df
 
+@st.cache_data(show_spinner=False)
+def _to_csv_bytes(df):
+    # The download payload only changes when the data does, not on every widget rerun
+    return df.to_csv(index=False).encode('utf-8')
+
+@st.cache_data(show_spinner=False)
+def _build_figures(_df_clean, latest_date, n_rows):
+    # Keyed on the newest bulletin and row count instead of hashing the frame; the data only changes monthly
+    # Reshape all four series into one long frame; the suffix tells the two charts apart
+    df_long = _df_clean.melt(id_vars='Bulletin_Date', value_vars=list(('EB2_Filing', 'EB3_Filing', 'EB2_FAD', 'EB3_FAD')),
+                             var_name='Series', value_name='Cutoff').dropna(subset=list(('Cutoff',)))
+    df_long = df_long.assign(Category=df_long.Series.str.split('_').str[0])
+    is_dof = df_long.Series.str.endswith('Filing')
+
+    # WebGL traces with small markers: the history only grows, and SVG markers dominate browser render time
+    fig_dof = px.line(df_long[is_dof], 
+                      x='Bulletin_Date', y='Cutoff', color='Category', 
+                      markers=True, 
+                      labels=dict(Bulletin_Date='Visa Bulletin Release Month', Cutoff='Cutoff Priority Date'),
+                      line_shape='hv', render_mode='webgl')
+    fig_dof.update_layout(yaxis=dict(tickformat="%b %Y"), xaxis=dict(tickformat="%b %Y"))
+    fig_dof.update_traces(marker=dict(size=4))
+
+    fig_fad = px.line(df_long[~is_dof], 
+                      x='Bulletin_Date', y='Cutoff', color='Category', 
+                      markers=True, 
+                      labels=dict(Bulletin_Date='Visa Bulletin Release Month', Cutoff='Cutoff Priority Date'),
+                      line_shape='hv', render_mode='webgl')
+    fig_fad.update_layout(yaxis=dict(tickformat="%b %Y"), xaxis=dict(tickformat="%b %Y"))
+    fig_fad.update_traces(marker=dict(size=4))
+    return fig_dof, fig_fad
+
 # --- UI & CHARTS ---
 st.title("📈 EB-2 & EB-3 India Visa Bulletin Tracker")
 st.markdown("Live scraping of Final Action Dates and Dates of Filing directly from the U.S. State Department.")
@@ -238,72 +190,59 @@ if is_admin:
     with st.sidebar:
         st.markdown("### Admin Controls (Unlocked)")
         if st.button("Delete Database & Re-Scrape"):
-            if os.path.exists(DATA_FILE):
-                os.remove(DATA_FILE)
-                st.rerun()
+            # Also drop every cached response and parse, or past-year months would just be rebuilt from them
+            for db_file in (DATA_FILE, SEED_FILE, CACHE_FILE):
+                if os.path.exists(db_file):
+                    os.remove(db_file)
+            clear_parsed_cells()
+            _fetched_bulletins.clear()
+            load_db.clear()
+            st.rerun()
 
 with st.spinner("Checking for missing bulletin releases..."):
     df = init_or_update_db()
 
 df_clean = df.dropna(subset=list(('EB2_Filing', 'EB2_FAD', 'EB3_Filing', 'EB3_FAD')), how='all')
 
+# df is already sorted by Bulletin_Date (load_db / init_or_update_db), so read the latest values straight off it
+latest_month = df_clean.Bulletin_Date.max()
+eb2_dof_idx = df_clean.EB2_Filing.last_valid_index()
+eb3_dof_idx = df_clean.EB3_Filing.last_valid_index()
+
 col1, col2, col3 = st.columns(3)
 with col1:
     val1 = "N/A"
-    if not df_clean.empty:
-        val1 = df_clean.Bulletin_Date.tail(1).item().strftime('%B %Y')
+    if not pd.isna(latest_month):
+        val1 = latest_month.strftime('%B %Y')
     st.metric(label="Latest Bulletin Month", value=val1)
     
 with col2:
     val2 = "N/A"
-    if not df_clean.dropna(subset=list(('EB2_Filing',))).empty:
-        val2 = df_clean.dropna(subset=list(('EB2_Filing',))).EB2_Filing.tail(1).item().strftime('%d %b %Y')
+    if eb2_dof_idx is not None:
+        val2 = df_clean.EB2_Filing[eb2_dof_idx].strftime('%d %b %Y')
     st.metric(label="Latest EB-2 Date of Filing", value=val2)
     
 with col3:
     val3 = "N/A"
-    if not df_clean.dropna(subset=list(('EB3_Filing',))).empty:
-        val3 = df_clean.dropna(subset=list(('EB3_Filing',))).EB3_Filing.tail(1).item().strftime('%d %b %Y')
+    if eb3_dof_idx is not None:
+        val3 = df_clean.EB3_Filing[eb3_dof_idx].strftime('%d %b %Y')
     st.metric(label="Latest EB-3 Date of Filing", value=val3)
 
 st.divider()
 
-df_plot_dof = pd.DataFrame(dict(
-    Bulletin_Date=df_clean.Bulletin_Date,
-    EB2=df_clean.EB2_Filing,
-    EB3=df_clean.EB3_Filing
-))
-
-df_plot_fad = pd.DataFrame(dict(
-    Bulletin_Date=df_clean.Bulletin_Date,
-    EB2=df_clean.EB2_FAD,
-    EB3=df_clean.EB3_FAD
-))
+fig_dof, fig_fad = _build_figures(df_clean, latest_month, len(df_clean))
 
 st.subheader("🗓️ Date of Filing Movement (EB-2 vs EB-3)")
-fig_dof = px.line(df_plot_dof.dropna(subset=list(('EB2', 'EB3')), how='all'), 
-                  x='Bulletin_Date', y=list(('EB2', 'EB3')), 
-                  markers=True, 
-                  labels=dict(Bulletin_Date='Visa Bulletin Release Month', value='Cutoff Priority Date', variable='Category'),
-                  line_shape='hv')
-fig_dof.update_layout(yaxis=dict(tickformat="%b %Y"), xaxis=dict(tickformat="%b %Y"))
-
 st.plotly_chart(fig_dof, use_container_width=True, key="dof_chart")
 
 st.subheader("⚖️ Final Action Date Movement (EB-2 vs EB-3)")
-fig_fad = px.line(df_plot_fad.dropna(subset=list(('EB2', 'EB3')), how='all'), 
-                  x='Bulletin_Date', y=list(('EB2', 'EB3')), 
-                  markers=True, 
-                  labels=dict(Bulletin_Date='Visa Bulletin Release Month', value='Cutoff Priority Date', variable='Category'),
-                  line_shape='hv')
-fig_fad.update_layout(yaxis=dict(tickformat="%b %Y"), xaxis=dict(tickformat="%b %Y"))
-
 st.plotly_chart(fig_fad, use_container_width=True, key="fad_chart")
 
 with st.expander("View Scraped Raw Data"):
-    st.dataframe(df.sort_values(by="Bulletin_Date", ascending=False).reset_index(drop=True))
+    # Newest first: reversing the already-sorted frame is a view, not another sort + copy
+    st.dataframe(df.iloc[::-1], hide_index=True)
     
-    csv = df.to_csv(index=False).encode('utf-8')
+    csv = _to_csv_bytes(df)
     st.download_button(
         label="📥 Download Updated Database to File",
         data=csv,
@@ -0,0 +1,268 @@
+import pandas as pd
+import numpy as np
+import aiohttp
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+import asyncio
+import lxml.html
+from datetime import datetime, timedelta
+from functools import lru_cache
+import io
+import time
+import re
+
+# --- CONSTANTS & CONFIG ---
+DATA_FILE = 'eb2_india_data.parquet'
+SEED_FILE = 'eb2_india_data.csv'
+CACHE_FILE = 'bulletin_cache.sqlite'
+DB_COLUMNS = ('Bulletin_Date', 'EB2_Filing', 'EB2_FAD', 'EB3_Filing', 'EB3_FAD')
+# Day-resolution data: second precision is plenty (Parquet has no seconds unit, so it round-trips as ms and load_db narrows it back)
+DB_DTYPES = dict.fromkeys(DB_COLUMNS, 'datetime64[s]')
+
+# How long anything about a possibly unreleased month is trusted (HTTP cache, app-level fetch results)
+UNRELEASED_TTL = timedelta(hours=6)
+
+# Fail fast on an unreachable host instead of spending the whole budget on the connect
+_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+
+# Parsed cells of immutable (past fiscal year) bulletins, keyed on (url, categories)
+_PARSED_CELLS = dict()
+
+# Employment-based preference rows we track, keyed by the row label used in the bulletin tables
+EB_CATEGORIES = ('2ND', '3RD')
+
+MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december")
+_MONTH_IDX = {month: i + 1 for i, month in enumerate(MONTHS)}
+MONTHS_DICT = dict(enumerate(MONTHS, start=1))
+
+# --- UTILITY FUNCTIONS ---
+def parse_priority_dates(raw_dates, bulletin_dates):
+    # One vectorized pass over every cell instead of a try/except per date.
+    # bulletin_dates is a single date or one per cell, used for "C" (current) entries.
+    raw = pd.Series(raw_dates, dtype='string').str.strip().str.upper()
+    is_current = raw.isin(("C", "CURRENT"))
+    raw = raw.mask(raw.isin(("U", "UNAUTHORIZED", "UNAVAILABLE")) | (raw == ""))
+
+    parsed = pd.to_datetime(raw, format='%d%b%y', errors='coerce')
+    leftover = parsed.isna() & raw.notna() & ~is_current
+    if leftover.any():
+        parsed[leftover] = pd.to_datetime(raw[leftover], format='mixed', errors='coerce')
+    return parsed.mask(is_current, pd.to_datetime(pd.Series(bulletin_dates, index=raw.index)))
+
+@lru_cache(maxsize=256)
+def get_bulletin_url(month_name, year):
+    month_idx = _MONTH_IDX[month_name.lower()]
+    fiscal_year = year + 1 if month_idx >= 10 else year
+    return f"https://travel.state.gov/content/travel/en/legal/visa-law0/visa-bulletin/{fiscal_year}/visa-bulletin-for-{month_name.lower()}-{year}.html"
+
+def is_unreleased_month(month_name, year):
+    # This month's and later bulletins may still 404 today and appear at any time
+    today = datetime.today()
+    return datetime(year, _MONTH_IDX[month_name.lower()], 1) >= datetime(today.year, today.month, 1)
+
+def get_cache_expiry(month_name, year):
+    # Published bulletins never change, so only recent ones need re-checking
+    if is_unreleased_month(month_name, year):
+        # Possibly unreleased (404) - keep it short so we pick it up once published
+        return UNRELEASED_TTL
+
+    today = datetime.today()
+    month_idx = _MONTH_IDX[month_name.lower()]
+
+    fiscal_year = year + 1 if month_idx >= 10 else year
+    current_fiscal_year = today.year + 1 if today.month >= 10 else today.year
+    if fiscal_year < current_fiscal_year:
+        return -1
+    return timedelta(days=30)
+
+def clear_parsed_cells():
+    # Forget memoized past-year bulletins so the next fetch re-parses them
+    _PARSED_CELLS.clear()
+
+def empty_bulletin_cells(categories=EB_CATEGORIES):
+    return {category: (None, None) for category in categories}
+
+# --- SCRAPING LOGIC ---
+@lru_cache(maxsize=None)
+def _row_marker_pattern(categories):
+    return re.compile(r'\b(' + '|'.join(re.escape(c) for c in categories) + r')\b')
+
+def read_bulletin_tables(doc, categories=EB_CATEGORIES):
+    # Parse each table on its own with lxml rather than re-parsing the whole page at once.
+    # Yields lazily so callers can stop once they have what they need.
+    for table in doc.iter('table'):
+        # Skip family-based/notice tables up front: they can never hold an India cell for our categories.
+        # Checking the text only avoids serializing and upper-casing the markup of every table.
+        # No separator between text nodes: "2<sup>nd</sup>" must still read as 2ND, like read_html sees it.
+        upper_text = table.text_content().upper()
+        if 'INDIA' not in upper_text or not any(c in upper_text for c in categories):
+            continue
+        try:
+            yield from pd.read_html(io.StringIO(lxml.html.tostring(table, encoding='unicode')), flavor='lxml')
+        except ValueError:
+            continue
+
+def _find_marker_rows(upper_grid, categories):
+    # Vectorized substring pre-filter, then confirm the whole-word match on candidate rows only
+    has_marker = np.zeros(upper_grid.shape, dtype=bool)
+    for category in categories:
+        has_marker |= np.char.find(upper_grid, category) >= 0
+
+    row_marker = _row_marker_pattern(categories)
+    marker_rows = dict()
+    for i in np.flatnonzero(has_marker.any(axis=1)):
+        for cell in upper_grid[i]:
+            for marker in row_marker.findall(cell):
+                marker_rows.setdefault(marker, i)
+        if len(marker_rows) == len(categories):
+            break
+    return marker_rows
+
+def extract_india_dates(df_table, categories=EB_CATEGORIES):
+    grid = np.vstack((
+        np.asarray(df_table.columns.map(str), dtype=str),
+        df_table.to_numpy(dtype=str)
+    ))
+    upper_grid = np.char.upper(grid)
+
+    # Country names live in the header row, so this normally stops after one row
+    india_col_idx = None
+    for upper_row in upper_grid:
+        india_hits = np.flatnonzero(np.char.find(upper_row, 'INDIA') >= 0)
+        if india_hits.size:
+            india_col_idx = india_hits[0]
+            break
+    if india_col_idx is None:
+        return dict.fromkeys(categories)
+
+    marker_rows = _find_marker_rows(upper_grid, categories)
+    return {
+        category: str(grid[marker_rows[category], india_col_idx]) if category in marker_rows else None
+        for category in categories
+    }
+
+def extract_bulletin_cells(html_content, categories=EB_CATEGORIES):
+    # Raw India cells per category as (Final Action Date, Date for Filing), left unparsed
+    if not html_content:
+        return empty_bulletin_cells(categories)
+    try:
+        # lxml's C parser directly; BeautifulSoup only added a Python tree on top of it
+        doc = lxml.html.fromstring(html_content)
+        tables = read_bulletin_tables(doc, categories)
+
+        dates_found = {category: list() for category in categories}
+        for df_table in tables:
+            for category, cell in extract_india_dates(df_table, categories).items():
+                # Extra guard to prevent empty 'NaN' tables from breaking the logic
+                if cell is not None and str(cell).strip().lower() not in ("", "nan"):
+                    dates_found[category].append(cell)
+            # Both Final Action and Filing tables seen for every category: the rest of the page is irrelevant
+            if all(len(found) >= 2 for found in dates_found.values()):
+                break
+
+        # First table is Final Action Dates, second is Dates for Filing
+        return {category: tuple((dates_found[category] + list((None, None)))[:2]) for category in categories}
+    except Exception:
+        return empty_bulletin_cells(categories)
+
+def parse_bulletin_cells(cells_by_date, categories=EB_CATEGORIES):
+    # Parse every bulletin's cells in a single parse_priority_dates call
+    raw_dates = list()
+    bulletin_dates = list()
+    for d, cells in cells_by_date.items():
+        for category in categories:
+            raw_dates.extend(cells[category])
+            bulletin_dates.extend((d, d))
+    parsed = iter(parse_priority_dates(raw_dates, bulletin_dates).tolist())
+
+    return {
+        d: {category: (next(parsed), next(parsed)) for category in categories}
+        for d in cells_by_date
+    }
+
+class RateLimiter:
+    # Token bucket: allows a short burst, then averages out to `rate` requests per second
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+async def fetch_bulletin_cells(session, month_name, year, categories=EB_CATEGORIES, limiter=None):
+    url = get_bulletin_url(month_name, year)
+    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+
+    # REPAIRED: Added back the proxy fallback to bypass the Akamai Firewall
+    urls_to_try = (
+        url,
+        "https://api.allorigins.win/raw?url=" + url
+    )
+
+    expire_after = get_cache_expiry(month_name, year)
+    is_unreleased = is_unreleased_month(month_name, year)
+    memo_key = (url, categories)
+    if memo_key in _PARSED_CELLS:
+        return _PARSED_CELLS[memo_key]
+
+    html_content = None
+    for target_url in urls_to_try:
+        try:
+            # Only real network trips count against the rate limit, not cache hits.
+            # get_response (unlike has_url) ignores expired entries, which session.get is about to refetch.
+            if limiter is not None and await session.cache.get_response(session.cache.create_key('GET', target_url)) is None:
+                await limiter.acquire()
+            async with session.get(target_url, headers=headers, expire_after=expire_after, timeout=_FETCH_TIMEOUT) as response:
+                if response.status == 404:
+                    # A published month should never 404 (transient error or a changed URL slug), so don't
+                    # let its long expiry pin the miss; only unreleased months keep their short-lived 404
+                    if not is_unreleased:
+                        await session.cache.delete_url(target_url)
+                    # Going through the proxy would only download the same miss again
+                    break
+                if response.status == 200:
+                    content = await response.read()
+                    if b"Access Denied" not in content:
+                        html_content = content
+                        break
+                    # Never keep a firewall block page around in the cache
+                    await session.cache.delete_url(target_url)
+        except Exception:
+            pass
+
+    cells = extract_bulletin_cells(html_content, categories)
+    # Bulletins from past fiscal years are final; keep their parsed cells for the life of the process
+    if html_content and expire_after == -1:
+        _PARSED_CELLS[memo_key] = cells
+    return cells
+
+async def fetch_with_sem(sem, limiter, session, d, categories=EB_CATEGORIES):
+    async with sem:
+        return d, await fetch_bulletin_cells(session, MONTHS_DICT.get(d.month), d.year, categories, limiter)
+
+async def fetch_missing_bulletins(missing_dates, on_progress=None, categories=EB_CATEGORIES):
+    # Scraping is network-bound, so fetch every missing month concurrently (politely capped)
+    sem = asyncio.Semaphore(10)
+    limiter = RateLimiter(rate=3, burst=3)
+    results = dict()
+    cache = SQLiteBackend(CACHE_FILE, allowed_codes=(200, 404))
+    # Keep connections to travel.state.gov (and the proxy) alive between months
+    connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=30)
+    async with CachedSession(cache=cache, connector=connector) as session:
+        tasks = list(fetch_with_sem(sem, limiter, session, d, categories) for d in missing_dates)
+        for done, next_result in enumerate(asyncio.as_completed(tasks), start=1):
+            d, cells = await next_result
+            results[d] = cells
+            if on_progress is not None:
+                on_progress(done, d)
+    return parse_bulletin_cells(results, categories)